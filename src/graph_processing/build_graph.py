@@ -1,6 +1,7 @@
 import os
 import json
 import logging
+from collections import Counter
 from typing import List, Dict, Optional
 
 import networkx as nx
@@ -8,6 +9,20 @@ import pandas as pd
 
 from src.data_ingestion.fetch_data import DataFetcher
 
+def add_interaction(G: nx.DiGraph, source, target, timestamp, edge_type):
+    """Fold one interaction into the weighted (source, target) edge of ``G``.
+
+    The edge counts interactions as ``weight``, tallies ``edge_types`` and
+    appends (timestamp, edge_type) to its ``timeline``; callers adding
+    interactions out of timestamp order must sort the timelines afterwards.
+    """
+    if not G.has_edge(source, target):
+        G.add_edge(source, target, weight=0, edge_types=Counter(), timeline=[])
+    edge = G[source][target]
+    edge['weight'] += 1
+    edge['edge_types'][edge_type] += 1
+    edge['timeline'].append((timestamp, edge_type))
+
 class GraphBuilder:
     def __init__(self):
         logging.basicConfig(level=logging.INFO)
@@ -80,6 +95,24 @@ class GraphBuilder:
         self.logger.info(f"Graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
         return G
 
+    def collapse_parallel_edges(self, G: nx.MultiDiGraph) -> nx.DiGraph:
+        """Collapse parallel edges into one weighted edge per (source, target) pair.
+
+        Each edge keeps its interaction count as ``weight``, a Counter of
+        ``edge_types`` and a ``timeline`` of (timestamp, edge_type) pairs sorted
+        by timestamp.
+        """
+        D = nx.DiGraph()
+        D.add_nodes_from(G.nodes(data=True))
+        for source, target, data in G.edges(data=True):
+            add_interaction(D, source, target, data['timestamp'], data['edge_type'])
+
+        for _, _, data in D.edges(data=True):
+            data['timeline'].sort()
+
+        self.logger.info(f"Collapsed {G.number_of_edges()} edges into {D.number_of_edges()} weighted edges")
+        return D
+
     def calculate_connection_strength(self, G, core_nodes):
         connection_strength = {}
         for node in G.nodes():
@@ -98,7 +131,8 @@ class GraphBuilder:
         connection_strength = self.calculate_connection_strength(G, core_nodes)
         top_nodes = sorted(connection_strength, key=connection_strength.get, reverse=True)[:top_n]
         filtered_nodes = set(top_nodes + core_nodes)
-        return G.subgraph(filtered_nodes).copy()
+        # Read-only view; callers that keep or mutate the graph should copy it
+        return nx.subgraph_view(G, filter_node=nx.filters.show_nodes(filtered_nodes))
 
     def build_and_filter_graph(self, fids: List[str]) -> nx.MultiDiGraph:
         all_user_data = self.data_fetcher.get_all_users_data(fids)
@@ -1,24 +1,28 @@
 import dash
-from dash import Dash, html, dcc
+from dash import Dash, html, dcc, DiskcacheManager
 import dash_cytoscape as cyto
 import dash_bootstrap_components as dbc
+import diskcache
 
 from src.graph_viz.layout_and_styling import cyto_stylesheet
 from src.graph_viz.callbacks import register_callbacks
 from src.graph_viz.config import (
     DEBUG, PORT, DEFAULT_LAYOUT, CYTOSCAPE_STYLE, 
-    LAYOUT_OPTIONS, CYTOSCAPE_LAYOUT_SETTINGS
+    LAYOUT_OPTIONS, CYTOSCAPE_LAYOUT_SETTINGS, BACKGROUND_CACHE_DIR, TIME_SLIDER_STEP
 )
 
 # Load extra layouts for Cytoscape
 cyto.load_extra_layouts()
 
+# Background callbacks (graph building) run in separate processes backed by diskcache
+background_callback_manager = DiskcacheManager(diskcache.Cache(BACKGROUND_CACHE_DIR))
+
 # Initialize the Dash app with Bootstrap stylesheet and Open Sans font
 app = Dash(__name__, external_stylesheets=[
     dbc.themes.BOOTSTRAP, 
     'https://use.fontawesome.com/releases/v5.8.1/css/all.css',
     'https://fonts.googleapis.com/css2?family=Open+Sans:wght@400;700&display=swap'
-])
+], background_callback_manager=background_callback_manager)
 
 # Define the app layout
 app.layout = html.Div([
@@ -74,7 +78,8 @@ app.layout = html.Div([
     
     # Time Slider
     html.Div([
-        dcc.Slider(id='time-slider', min=0, max=100, value=0, marks={}, step=10),
+        # Only fire on release: every value change reruns the elements and matrices callbacks
+        dcc.Slider(id='time-slider', min=0, max=100, value=0, marks={}, step=TIME_SLIDER_STEP, updatemode='mouseup'),
     ], style={'margin-bottom': '12px', 'padding-left': '24px'}),
     
     # Main content area
@@ -136,6 +141,8 @@ app.layout = html.Div([
     # Store Components
     dcc.Store(id='graph-store'),
     dcc.Store(id='timestamp-store'),
+    dcc.Store(id='elements-delta-store'),
+    dcc.Store(id='elements-state-store'),  # Graph token and slider value currently rendered
     
     # Loading Overlay
     html.Div([
@@ -10,7 +10,12 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.graph_viz.network_analysis import filter_graph, get_elements, get_adjacency_matrix, get_shortest_path_matrix
+from src.graph_viz.network_analysis import (
+    filter_graph, get_elements, diff_elements, get_adjacency_matrix, get_shortest_path_matrix
+)
+from src.graph_viz.graph_cache import (
+    new_graph_token, graph_to_store_data, get_graph, get_graph_entry, get_snapshot, slider_timestamp
+)
 from src.data_ingestion.fetch_data import DataFetcher
 from src.graph_processing.build_graph import GraphBuilder
 
@@ -21,30 +26,38 @@ def register_callbacks(app):
         Output('node-count', 'children'),
         Output('edge-count', 'children'),
         Input('build-graph-button', 'n_clicks'),
-        State('user-ids-input', 'value')
+        State('user-ids-input', 'value'),
+        # Fetching network data can take a while, so run it off the web worker
+        background=True,
+        running=[(Output('build-graph-button', 'disabled'), True, False)],
+        progress=[Output('loading-output', 'children')],
+        prevent_initial_call=True
     )
-    def build_graph(n_clicks, user_ids_input):
+    def build_graph(set_progress, n_clicks, user_ids_input):
         if n_clicks is None or not user_ids_input:
             raise PreventUpdate
 
         try:
             core_nodes = [uid.strip() for uid in user_ids_input.split(',') if uid.strip()]
+            set_progress("Fetching network data...")
             fetcher = DataFetcher()
             all_user_data = fetcher.get_all_users_data(core_nodes)
+            set_progress("Building graph...")
             gb = GraphBuilder()
-            G = gb.build_graph_from_data(all_user_data)
+            G = gb.collapse_parallel_edges(gb.build_graph_from_data(all_user_data))
             filtered_G = filter_graph(G, core_nodes)
 
-            all_timestamps = sorted([edge[2]['timestamp'] for edge in filtered_G.edges(data=True)])
-            min_timestamp, max_timestamp = min(all_timestamps), max(all_timestamps)
-
-            graph_data = nx.readwrite.json_graph.node_link_data(filtered_G)
-            graph_data['min_timestamp'] = min_timestamp
-            graph_data['max_timestamp'] = max_timestamp
+            graph_data = graph_to_store_data(filtered_G)
+            # Interactions are stored sorted by timestamp
+            graph_data['min_timestamp'] = graph_data['ts'][0]
+            graph_data['max_timestamp'] = graph_data['ts'][-1]
             graph_data['core_nodes'] = core_nodes
+            # This runs in a background process, so the web worker caches the graph
+            # under this token the first time a callback looks it up
+            graph_data['graph_token'] = new_graph_token()
 
             node_count = filtered_G.number_of_nodes()
-            edge_count = filtered_G.number_of_edges()
+            edge_count = int(filtered_G.size(weight='weight'))  # Every interaction counts
 
             return graph_data, '', f"Nodes: {node_count}", f"Edges: {edge_count}"
         except Exception as e:
@@ -70,26 +83,44 @@ def register_callbacks(app):
         return timestamp_data, {}
 
     @app.callback(
-        Output('cytoscape-graph', 'elements'),
+        Output('elements-delta-store', 'data'),
         Output('node-count', 'children', allow_duplicate=True),
         Output('edge-count', 'children', allow_duplicate=True),
         Input('time-slider', 'value'),
         Input('graph-store', 'data'),
         Input('timestamp-store', 'data'),
+        State('elements-state-store', 'data'),
         prevent_initial_call=True
     )
-    def update_elements_and_metrics(selected_timestamp, graph_data, timestamp_data):
+    def update_elements_and_metrics(selected_timestamp, graph_data, timestamp_data, rendered_state):
         if not graph_data or not timestamp_data:
-            return [], "Nodes: 0", "Edges: 0"
+            cleared = {'reset': True, 'add': [], 'remove': [], 'update': [], 'state': None}
+            return cleared, "Nodes: 0", "Edges: 0"
 
-        G = nx.readwrite.json_graph.node_link_graph(graph_data, multigraph=True)
+        entry = get_graph_entry(graph_data)
         core_nodes = graph_data['core_nodes']
 
         min_timestamp = timestamp_data['min_timestamp']
         max_timestamp = timestamp_data['max_timestamp']
-        actual_timestamp = min_timestamp + (selected_timestamp / 100) * (max_timestamp - min_timestamp)
 
-        new_elements = get_elements(G, actual_timestamp, core_nodes)
+        def elements_at(slider_value):
+            # Snapshots for every slider step are precomputed with the graph
+            timestamp = slider_timestamp(min_timestamp, max_timestamp, slider_value)
+            return get_elements(
+                entry['graph'], timestamp, core_nodes, min_timestamp,
+                snapshot=get_snapshot(entry, timestamp)
+            )
+
+        new_elements = elements_at(selected_timestamp)
+        state = {'graph_token': entry['token'], 'slider_value': selected_timestamp}
+
+        # Only send what changed since the rendered slider position; the browser
+        # patches the element list. A new graph replaces everything
+        if rendered_state and rendered_state['graph_token'] == entry['token']:
+            delta = diff_elements(elements_at(rendered_state['slider_value']), new_elements)
+            delta.update(reset=False, state=state)
+        else:
+            delta = {'reset': True, 'add': new_elements, 'remove': [], 'update': [], 'state': state}
 
         visible_nodes = set()
         visible_edges = 0
@@ -101,7 +132,47 @@ def register_callbacks(app):
             else:  # It's a node
                 visible_nodes.add(element['data']['id'])
 
-        return new_elements, f"Nodes: {len(visible_nodes)}", f"Edges: {visible_edges}"
+        return delta, f"Nodes: {len(visible_nodes)}", f"Edges: {visible_edges}"
+
+    # Apply the element delta to the rendered list. dash-cytoscape doesn't expose its
+    # cy instance, so the patch is applied to the elements prop rather than via cy.add()
+    app.clientside_callback(
+        """
+        function(delta, elements) {
+            if (!delta) {
+                return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+            }
+            const removed = new Set(delta.remove);
+            const updated = new Map(delta.update.map(element => [element.data.id, element.data]));
+            const patched = (delta.reset ? [] : elements || [])
+                .filter(element => !removed.has(element.data.id))
+                .map(element => updated.has(element.data.id)
+                    ? Object.assign({}, element, {data: Object.assign({}, element.data, updated.get(element.data.id))})
+                    : element);
+            return [patched.concat(delta.add), delta.state];
+        }
+        """,
+        Output('cytoscape-graph', 'elements'),
+        Output('elements-state-store', 'data'),
+        Input('elements-delta-store', 'data'),
+        State('cytoscape-graph', 'elements')
+    )
+
+    # Highlight edges from the top N non-core nodes to core nodes in the browser. N grows
+    # from 1 to 10 across the slider; only the selector changes, not the elements
+    app.clientside_callback(
+        """
+        function(sliderValue, stylesheet) {
+            const topN = Math.min(Math.floor(1 + 9 * (sliderValue || 0) / 100), 10);
+            return stylesheet.map(rule => rule.selector.startsWith('edge[core_rank')
+                ? Object.assign({}, rule, {selector: 'edge[core_rank < ' + topN + ']'})
+                : rule);
+        }
+        """,
+        Output('cytoscape-graph', 'stylesheet'),
+        Input('time-slider', 'value'),
+        State('cytoscape-graph', 'stylesheet')
+    )
 
     @app.callback(
         Output('cytoscape-graph', 'layout'),
@@ -234,13 +305,15 @@ def register_callbacks(app):
         if not graph_data:
             return {}, {}
         
-        G = nx.readwrite.json_graph.node_link_graph(graph_data, multigraph=True)
+        G = get_graph(graph_data)
         min_timestamp = graph_data['min_timestamp']
         max_timestamp = graph_data['max_timestamp']
-        current_timestamp = min_timestamp + (time_slider_value / 100) * (max_timestamp - min_timestamp)
+        current_timestamp = slider_timestamp(min_timestamp, max_timestamp, time_slider_value)
         
         # Filter the graph based on the current timestamp
-        G_filtered = nx.Graph((u, v, d) for (u, v, d) in G.edges(data=True) if d['timestamp'] <= current_timestamp)
+        G_filtered = nx.Graph(
+            (u, v) for (u, v, d) in G.edges(data=True) if d['timeline'][0][0] <= current_timestamp
+        )
         
         # Ensure node attributes are copied to the filtered graph
         for node, data in G.nodes(data=True):
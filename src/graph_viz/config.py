@@ -3,10 +3,14 @@ import datetime
 # Application settings
 DEBUG = True
 PORT = 8050
+BACKGROUND_CACHE_DIR = './cache'  # diskcache store for background callbacks
 
 # Graph settings
 DEFAULT_LAYOUT = 'cose-bilkent'
 TOP_N_NODES = 25
+TIME_SLIDER_STEP = 10  # Slider runs 0-100; snapshots are precomputed for each step
+GRAPH_CACHE_SIZE = 16  # Built graphs kept in memory per worker
+BETWEENNESS_MIN_NODES = 10  # Smaller snapshots are colored by degree centrality instead
 
 # Node sizes
 CORE_NODE_SIZE = 112.5
@@ -0,0 +1,110 @@
+import threading
+import uuid
+
+import networkx as nx
+
+from src.graph_processing.build_graph import add_interaction
+from src.graph_viz.config import GRAPH_CACHE_SIZE, TIME_SLIDER_STEP
+from src.graph_viz.network_analysis import (
+    get_edge_arrays, count_active_interactions, get_prefix_snapshot
+)
+
+# Node attributes the visualization reads; the rest stay out of graph-store
+STORE_NODE_ATTRS = ('username', 'pfp_url', 'follower_count', 'following_count')
+
+# Process-local graphs keyed by the token written into graph-store, so callbacks
+# don't rebuild the graph from JSON on every slider move
+_GRAPH_CACHE = {}
+# Serializes cache misses: a new graph-store fires several callbacks at once, and
+# only one of them should rebuild the graph and precompute its snapshots
+_GRAPH_CACHE_LOCK = threading.Lock()
+
+SLIDER_VALUES = range(0, 101, TIME_SLIDER_STEP)
+
+def slider_timestamp(min_timestamp, max_timestamp, value):
+    return min_timestamp + (value / 100) * (max_timestamp - min_timestamp)
+
+def _store_graph(token, G, core_nodes):
+    # The graph is immutable for the session, so build its timestamp-sorted
+    # edge arrays once up front; the first slider move doesn't pay for them
+    edges = get_edge_arrays(G)
+    entry = {
+        'token': token,
+        'graph': G,
+        'core_nodes': tuple(core_nodes),
+        'edges': edges,
+        # Active interaction count -> snapshot; evicted together with the graph
+        'snapshots': {},
+    }
+    # Precompute every slider step so slider moves are a lookup
+    min_timestamp, max_timestamp = edges['ts'][0].item(), edges['ts'][-1].item()
+    for value in SLIDER_VALUES:
+        get_snapshot(entry, slider_timestamp(min_timestamp, max_timestamp, value))
+    _GRAPH_CACHE[token] = entry
+    # Evict the oldest graphs once the cache is full (dicts keep insertion order)
+    while len(_GRAPH_CACHE) > GRAPH_CACHE_SIZE:
+        _GRAPH_CACHE.pop(next(iter(_GRAPH_CACHE)))
+    return entry
+
+def new_graph_token():
+    return uuid.uuid4().hex
+
+def graph_to_store_data(G):
+    """Serialize ``G`` for graph-store as parallel edge arrays.
+
+    Nodes keep only ``STORE_NODE_ATTRS`` and each interaction is one entry of
+    ``src``/``dst`` (node positions), ``ts`` and ``etype`` (a position in the
+    ``edge_types`` vocabulary), sorted by timestamp.
+    """
+    arrays = get_edge_arrays(G)
+    return {
+        'nodes': arrays['nodes'],
+        'node_data': [
+            {attr: G.nodes[node][attr] for attr in STORE_NODE_ATTRS if attr in G.nodes[node]}
+            for node in arrays['nodes']
+        ],
+        'edge_types': arrays['edge_types'],
+        'src': arrays['src'].tolist(),
+        'dst': arrays['dst'].tolist(),
+        'ts': arrays['ts'].tolist(),
+        'etype': arrays['etype'].tolist(),
+    }
+
+def graph_from_store_data(graph_data):
+    """Rebuild the weighted DiGraph written by ``graph_to_store_data``."""
+    nodes = graph_data['nodes']
+    edge_types = graph_data['edge_types']
+    G = nx.DiGraph()
+    G.add_nodes_from(zip(nodes, graph_data['node_data']))
+    # Interactions arrive sorted by timestamp, so each timeline stays sorted
+    for source, target, timestamp, etype in zip(
+        graph_data['src'], graph_data['dst'], graph_data['ts'], graph_data['etype']
+    ):
+        add_interaction(G, nodes[source], nodes[target], timestamp, edge_types[etype])
+    return G
+
+def get_graph_entry(graph_data):
+    token = graph_data.get('graph_token')
+    entry = _GRAPH_CACHE.get(token)
+    if entry is None:
+        with _GRAPH_CACHE_LOCK:
+            # Another callback may have stored it while this one waited
+            entry = _GRAPH_CACHE.get(token)
+            if entry is None:
+                # Graph was built in a background worker (or evicted): rebuild it once and keep it
+                entry = _store_graph(
+                    token or new_graph_token(), graph_from_store_data(graph_data), graph_data['core_nodes']
+                )
+    return entry
+
+def get_snapshot(entry, timestamp):
+    """Snapshot of ``entry``'s graph at ``timestamp``, computed once per set of active edges."""
+    n_active = count_active_interactions(entry['edges'], timestamp)
+    snapshot = entry['snapshots'].get(n_active)
+    if snapshot is None:
+        snapshot = get_prefix_snapshot(entry['graph'], entry['edges'], n_active, entry['core_nodes'])
+        entry['snapshots'][n_active] = snapshot
+    return snapshot
+
+def get_graph(graph_data):
+    return get_graph_entry(graph_data)['graph']
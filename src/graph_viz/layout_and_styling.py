@@ -3,6 +3,16 @@ from src.graph_viz.config import (
     LAYOUT_OPTIONS, CORE_NODE_SIZE, NON_CORE_BASE_SIZE
 )
 
+# Style for edges along paths to core nodes
+highlighted_edge_style = {
+    'line-color': COLORS['HIGHLIGHTED_EDGE'],
+    'width': 'data(normalized_weight)',
+    'opacity': 1.0,
+    'target-arrow-color': COLORS['HIGHLIGHTED_EDGE'],
+    'target-arrow-shape': 'triangle',
+    'arrow-scale': 1
+}
+
 # Cytoscape stylesheet
 cyto_stylesheet = [
     # Default node style (dimmed)
@@ -47,11 +57,11 @@ cyto_stylesheet = [
         'border-color': '#FFD700'  # Gold color for nodes with core interactions
     }
     },
-    # Highlighted nodes (along paths to core nodes)
+    # Highlighted nodes (along paths to core nodes), blue to magenta by betweenness
     {
         'selector': 'node[node_to_core = "true"]',
         'style': {
-            'background-color': 'data(color)',
+            'background-color': 'mapData(color_value, 0, 1, blue, magenta)',
         }
     },
     # Core nodes
@@ -78,14 +88,13 @@ cyto_stylesheet = [
     # Highlighted edges (along paths to core nodes)
     {
         'selector': 'edge[edge_to_core = "true"]',
-        'style': {
-            'line-color': COLORS['HIGHLIGHTED_EDGE'],
-            'width': 'data(normalized_weight)',
-            'opacity': 1.0,
-            'target-arrow-color': COLORS['HIGHLIGHTED_EDGE'],
-            'target-arrow-shape': 'triangle',
-            'arrow-scale': 1
-        }
+        'style': highlighted_edge_style
+    },
+    # Edges from the top N non-core nodes to core nodes; N is rewritten by a
+    # clientside callback as the time slider moves
+    {
+        'selector': 'edge[core_rank < 1]',
+        'style': highlighted_edge_style
     },
     # Edge hover style
     {
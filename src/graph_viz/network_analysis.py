@@ -1,130 +1,287 @@
 import networkx as nx
 import numpy as np
-from collections import Counter
+import scipy.sparse as sp
+from collections import Counter, defaultdict
+
+from src.graph_viz.config import (
+    BETWEENNESS_MIN_NODES, MIN_EDGE_WIDTH, MAX_EDGE_WIDTH
+)
 
 def calculate_connection_strength(G, core_nodes):
-    connection_strength = {}
-    for node in G.nodes():
-        if node not in core_nodes:
-            strengths = []
-            for core_node in core_nodes:
-                edge_count = (
-                    len(G.get_edge_data(node, core_node, default={}))
-                    + len(G.get_edge_data(core_node, node, default={}))
-                )
-                strengths.append(edge_count)
-            connection_strength[node] = min(strengths) if strengths else 0
-    return connection_strength
+    nodes = list(G.nodes())
+    non_core_nodes = [node for node in nodes if node not in core_nodes]
+    if not non_core_nodes:
+        return {}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    if not core_nodes or any(core_node not in index for core_node in core_nodes):
+        # A core node missing from the graph has no edges, so every minimum is 0
+        return dict.fromkeys(non_core_nodes, 0)
+
+    # Node x core edge counts as a sparse matrix, read straight from the core nodes'
+    # adjacency so edges that don't touch a core node are never visited. Collapsed
+    # graphs carry the parallel edge count as the weight; multigraph edges count 1 each
+    unique_core_nodes = list(dict.fromkeys(core_nodes))
+    rows, cols, data = [], [], []
+    for col, core_node in enumerate(unique_core_nodes):
+        neighbor_maps = (G.succ[core_node], G.pred[core_node]) if G.is_directed() else (G.adj[core_node],)
+        for neighbors in neighbor_maps:
+            rows.extend(map(index.__getitem__, neighbors))
+            cols.extend([col] * len(neighbors))
+            if G.is_multigraph():
+                # Multigraph neighbors map to {key: data}, one entry per parallel edge
+                data.extend(map(len, neighbors.values()))
+            else:
+                data.extend(edge.get('weight', 1) for edge in neighbors.values())
+    counts = sp.coo_array(
+        (np.array(data, dtype=np.int64), (rows, cols)),
+        shape=(len(nodes), len(unique_core_nodes))
+    ).tocsr()  # Sums the succ/pred entries of the same pair
+    rows = [index[node] for node in non_core_nodes]
+    strengths = counts[rows].toarray().min(axis=1)
+    return dict(zip(non_core_nodes, strengths.tolist()))
 
 def filter_graph(G, core_nodes, top_n=25):
     connection_strength = calculate_connection_strength(G, core_nodes)
     top_nodes = sorted(connection_strength, key=connection_strength.get, reverse=True)[:top_n]
     filtered_nodes = set(top_nodes + core_nodes)
-    return G.subgraph(filtered_nodes).copy()
+    # Read-only view; callers that keep or mutate the graph should copy it
+    return nx.subgraph_view(G, filter_node=nx.filters.show_nodes(filtered_nodes))
 
-def normalize_value(value, min_val, max_val, new_min, new_max):
-    if max_val == min_val:
-        return new_min
-    return ((value - min_val) / (max_val - min_val)) * (new_max - new_min) + new_min
+def get_edge_arrays(G):
+    """Flatten the graph's interactions into timestamp-sorted arrays.
 
-def get_elements(G, timestamp, core_nodes, tapNodeData=None):
-    cyto_elements = []
-    active_nodes = set(core_nodes)  # Initialize with core nodes
+    Nodes are mapped to a dense int32 range (``id2idx``) so the per-timestamp
+    work is NumPy indexing instead of dict lookups on string IDs. Each
+    interaction is one entry of ``src``, ``dst``, ``ts`` and ``etype`` (an index
+    into ``edge_types``); the interactions active at a timestamp are a
+    ``searchsorted`` prefix of the arrays. Ties are ordered by node index, so a
+    graph rebuilt from the arrays indexes to the same arrays. The graph cache
+    keeps the result for each graph it holds.
+    """
+    nodes = list(G.nodes())
+    id2idx = {node: i for i, node in enumerate(nodes)}
+    edge_types = {}
+    src, dst, ts, etype = [], [], [], []
+    for source, target, data in G.edges(data=True):
+        for timestamp, edge_type in data['timeline']:
+            src.append(id2idx[source])
+            dst.append(id2idx[target])
+            ts.append(timestamp)
+            etype.append(edge_types.setdefault(edge_type, len(edge_types)))
+
+    src = np.array(src, dtype=np.int32)
+    dst = np.array(dst, dtype=np.int32)
+    ts = np.array(ts, dtype=np.float64)
+    order = np.lexsort((dst, src, ts))
+    return {
+        'nodes': nodes,
+        'id2idx': id2idx,
+        'edge_types': list(edge_types),
+        'src': src[order],
+        'dst': dst[order],
+        'ts': ts[order],
+        'etype': np.array(etype, dtype=np.int32)[order],
+    }
+
+def build_snapshot_graph(snapshot):
+    """Build an undirected nx.Graph of the active nodes and edges in ``snapshot``."""
+    temp_G = nx.Graph()
+    temp_G.add_nodes_from(snapshot['active_nodes'])
+    temp_G.add_edges_from(
+        (node, neighbor)
+        for node, neighbors in snapshot['adjacency'].items()
+        for neighbor in neighbors
+    )
+    return temp_G
+
+def count_active_interactions(arrays, timestamp):
+    # Interactions are sorted by timestamp, so the active ones are a prefix
+    return int(np.searchsorted(arrays['ts'], timestamp, side='right'))
+
+def get_timestamp_snapshot(G, timestamp, core_nodes):
+    """Snapshot of the interactions up to ``timestamp``; see ``get_prefix_snapshot``."""
+    arrays = get_edge_arrays(G)
+    return get_prefix_snapshot(G, arrays, count_active_interactions(arrays, timestamp), core_nodes)
+
+def get_prefix_snapshot(G, arrays, n_active, core_nodes):
+    """Accumulate the first ``n_active`` interactions and compute node metrics.
+
+    ``arrays`` is ``get_edge_arrays(G)``. Nothing is cached here: the graph
+    cache keeps the snapshots of each graph it holds, keyed by active
+    interaction count, so they are dropped along with the graph. Snapshots
+    handed out by the cache are shared between calls and must not be mutated.
+    """
+    core_set = set(core_nodes)
+    nodes = arrays['nodes']
+    edge_types = arrays['edge_types']
+    n_nodes = len(nodes)
+
+    src = arrays['src'][:n_active]
+    dst = arrays['dst'][:n_active]
+    etype = arrays['etype'][:n_active]
+
+    # Count interactions for all nodes (a self-loop counts for both ends)
+    interactions = np.bincount(src, minlength=n_nodes) + np.bincount(dst, minlength=n_nodes)
+    interactions_count = dict(zip(nodes, interactions.tolist()))
+    interacting_nodes = {nodes[i] for i in np.flatnonzero(interactions).tolist()}
+    # Core nodes are always part of the snapshot graph, so they count towards the
+    # centrality and betweenness normalization even before their first interaction
+    active_nodes = {node for node in core_set if node in arrays['id2idx']} | interacting_nodes
+
+    # Collapse interactions to undirected node pairs; each pair keeps the direction
+    # of its earliest interaction
+    lo = np.minimum(src, dst).astype(np.int64)
+    hi = np.maximum(src, dst).astype(np.int64)
+    pair_keys, first, pair_of, pair_weights = np.unique(
+        lo * n_nodes + hi, return_index=True, return_inverse=True, return_counts=True
+    )
+    pair_lo, pair_hi = pair_keys // n_nodes, pair_keys % n_nodes
+
+    adjacency = defaultdict(set)  # Undirected neighbors, self-loops included
+    for u, v in zip(pair_lo.tolist(), pair_hi.tolist()):
+        adjacency[nodes[u]].add(nodes[v])
+        adjacency[nodes[v]].add(nodes[u])
+
+    # Distinct core nodes each node has an edge with (a core self-loop counts once)
+    core_mask = np.zeros(n_nodes, dtype=bool)
+    core_mask[[arrays['id2idx'][node] for node in core_set if node in arrays['id2idx']]] = True
+    core_hits = (
+        np.bincount(pair_lo, weights=core_mask[pair_hi], minlength=n_nodes)
+        + np.bincount(pair_hi, weights=core_mask[pair_lo] & (pair_lo != pair_hi), minlength=n_nodes)
+    ).astype(np.int64)
+
+    # Per-pair edge type tallies, split by whether the interaction runs from the
+    # pair's source or from its target
+    pair_sources, pair_targets = src[first], dst[first]
+    n_types = max(len(edge_types), 1)
+    type_keys, type_counts = np.unique(
+        (pair_of * 2 + (src != pair_sources[pair_of])) * n_types + etype, return_counts=True
+    )
+    type_pairs, type_index = np.divmod(type_keys, n_types)
+    type_pairs, type_reverse = np.divmod(type_pairs, 2)
 
     edge_dict = {}
-    edges_up_to_timestamp = []
-    interactions_count = {node: 0 for node in G.nodes()}  # Count for all nodes
-    
-    for edge in G.edges(data=True):
-        if edge[2]['timestamp'] <= timestamp:
-            source = str(edge[0])
-            target = str(edge[1])
-            active_nodes.add(source)
-            active_nodes.add(target)
-            edges_up_to_timestamp.append(edge)
-            
-            # Count interactions for all nodes
-            interactions_count[source] += 1
-            interactions_count[target] += 1
-            
-            if source != target:
-                edge_type = edge[2].get('edge_type', 'Unknown')
-                key = tuple(sorted((source, target)))  # Ensure consistent ordering
-                if key not in edge_dict:
-                    edge_dict[key] = {
-                        'data': {
-                            'source': source,
-                            'target': target,
-                            'source_username': G.nodes[source].get('username', source),  # Add username
-                            'target_username': G.nodes[target].get('username', target),  # Add username
-                            'weight': 1,
-                            'edge_types': Counter([edge_type]),
-                            'edge_to_core': 'false',  # Default value
-                            'interactions': {
-                                source: Counter([edge_type]),
-                                target: Counter()
-                            }
-                        }
-                    }
-                else:
-                    edge_dict[key]['data']['weight'] += 1
-                    edge_dict[key]['data']['edge_types'][edge_type] += 1
-                    edge_dict[key]['data']['interactions'][source][edge_type] += 1
+    pair_edges = [None] * len(pair_keys)
+    pair_sources, pair_targets, pair_weights = (
+        pair_sources.tolist(), pair_targets.tolist(), pair_weights.tolist()
+    )
+    for i in np.argsort(first, kind='stable').tolist():  # Earliest pairs first
+        source, target = nodes[pair_sources[i]], nodes[pair_targets[i]]
+        if source == target:
+            continue
+        key = tuple(sorted((source, target)))
+        edge_dict[key] = pair_edges[i] = {
+            'id': '-'.join(key),  # Stable across snapshots, so element deltas can match edges
+            'source': source,
+            'target': target,
+            'source_username': G.nodes[source].get('username', source),  # Add username
+            'target_username': G.nodes[target].get('username', target),  # Add username
+            'weight': pair_weights[i],
+            'edge_types': Counter(),
+            'edge_to_core': 'false',  # Default value
+            'interactions': {
+                source: Counter(),
+                target: Counter()
+            }
+        }
+    for pair_index, reverse, type_index, count in zip(
+        type_pairs.tolist(), type_reverse.tolist(), type_index.tolist(), type_counts.tolist()
+    ):
+        edge = pair_edges[pair_index]
+        if edge is None:
+            continue  # Self-loop
+        edge_type = edge_types[type_index]
+        edge['edge_types'][edge_type] += count
+        edge['interactions'][edge['target'] if reverse else edge['source']][edge_type] += count
 
     # Normalize edge weights and increase thickness for relationships with lots of interactions
     if edge_dict:
-        max_weight = max(edge['data']['weight'] for edge in edge_dict.values())
-        for edge in edge_dict.values():
-            normalized_weight = normalize_value(
-                edge['data']['weight'], 1, max_weight, 1.5, 15
-            )  # Increased max thickness by 2x
-            edge['data']['normalized_weight'] = normalized_weight
-
-    # Build a temporary graph up to the current timestamp
-    temp_G = nx.Graph()
-    temp_G.add_nodes_from(active_nodes)
-    temp_G.add_edges_from([(e[0], e[1]) for e in edges_up_to_timestamp])
-
-    # Calculate connection strength for non-core nodes
-    connection_strength = {}
-    for node in temp_G.nodes():
-        if node not in core_nodes:
-            strengths = []
-            for core_node in core_nodes:
-                if temp_G.has_edge(node, core_node):
-                    edge_count = temp_G.number_of_edges(node, core_node)
-                    strengths.append(edge_count)
-                else:
-                    strengths.append(0)
-            connection_strength[node] = min(strengths) if strengths else 0
+        edges = list(edge_dict.values())
+        weights = np.fromiter((edge['weight'] for edge in edges), dtype=float, count=len(edges))
+        max_weight = weights.max()
+        if max_weight > 1:
+            normalized_weights = (
+                (weights - 1) / (max_weight - 1) * (MAX_EDGE_WIDTH - MIN_EDGE_WIDTH) + MIN_EDGE_WIDTH
+            )
+        else:
+            normalized_weights = np.full_like(weights, MIN_EDGE_WIDTH)
+        for edge, normalized_weight in zip(edges, normalized_weights.tolist()):
+            edge['normalized_weight'] = normalized_weight
 
-    # Sort non-core nodes by their connection strength to core nodes
+    # Non-core nodes with an edge to every core node rank first
+    full_core_hits = core_hits == len(core_set)
+    connection_strength = {
+        node: int(bool(core_set) and full_core_hits[arrays['id2idx'][node]])
+        for node in interacting_nodes if node not in core_set
+    }
     sorted_nodes = sorted(connection_strength, key=connection_strength.get, reverse=True)
 
-    # Get all timestamps and sort them
-    all_timestamps = sorted([edge[2]['timestamp'] for edge in G.edges(data=True)])
-    min_timestamp, max_timestamp = min(all_timestamps), max(all_timestamps)
-
-    # Determine N based on timestamp
-    N = min(int(normalize_value(timestamp, min_timestamp, max_timestamp, 1, 10)), 10)
-    top_N_nodes = sorted_nodes[:N]
-
-    # Mark edges connected to top N non-core nodes
-    for edge_key, edge in edge_dict.items():
-        source = edge['data']['source']
-        target = edge['data']['target']
-        if (source in top_N_nodes and target in core_nodes) or (
-            target in top_N_nodes and source in core_nodes
-        ):
-            edge['data']['edge_to_core'] = 'true'
-        else:
-            edge['data']['edge_to_core'] = 'false'
+    # Rank of the non-core end of each edge to a core node; the browser highlights
+    # the top N of these as the time slider moves
+    rank = {node: i for i, node in enumerate(sorted_nodes)}
+    for edge in edge_dict.values():
+        if edge['source'] in core_set and edge['target'] in rank:
+            edge['core_rank'] = rank[edge['target']]
+        elif edge['target'] in core_set and edge['source'] in rank:
+            edge['core_rank'] = rank[edge['source']]
+
+    # Degree centrality from the distinct pairs (a self-loop adds 2 to the degree)
+    if len(active_nodes) > 1:
+        degrees = np.bincount(pair_lo, minlength=n_nodes) + np.bincount(pair_hi, minlength=n_nodes)
+        scale = 1 / (len(active_nodes) - 1)
+        centrality = {
+            node: degrees[arrays['id2idx'][node]].item() * scale
+            for node in active_nodes
+        }
+    else:
+        centrality = dict.fromkeys(active_nodes, 1)
+
+    snapshot = {
+        'active_nodes': active_nodes,
+        'adjacency': dict(adjacency),
+        'edge_dict': edge_dict,
+        'interactions_count': interactions_count,
+        'connected_core_nodes': dict(zip(nodes, core_hits.tolist())),
+        'sorted_nodes': sorted_nodes,
+        'centrality': centrality,
+    }
+
+    active_core_nodes = [node for node in core_set if node in interacting_nodes]
+    if len(active_nodes) > BETWEENNESS_MIN_NODES and active_core_nodes:
+        # Only shortest paths from the core nodes matter to the view, so skip the
+        # all-pairs pass and count just those
+        temp_G = build_snapshot_graph(snapshot)
+        snapshot['betweenness'] = nx.betweenness_centrality_subset(
+            temp_G, sources=active_core_nodes, targets=list(temp_G), normalized=True
+        )
+        snapshot['color_metric'] = snapshot['betweenness']
+    else:
+        # On a handful of nodes (or before any core node is active) the degree
+        # ranking is enough to color by
+        snapshot['betweenness'] = dict.fromkeys(active_nodes, 0)
+        snapshot['color_metric'] = centrality
 
-    # Calculate node metrics for non-core nodes
-    centrality = nx.degree_centrality(temp_G)
-    betweenness = nx.betweenness_centrality(temp_G)
-    max_centrality = max(centrality.values()) if centrality else 1
-    max_betweenness = max(betweenness.values()) if betweenness else 1
+    return snapshot
+
+def get_elements(G, timestamp, core_nodes, min_timestamp, tapNodeData=None, snapshot=None):
+    cyto_elements = []
+    if snapshot is None:  # Not from the graph cache, so compute it here
+        snapshot = get_timestamp_snapshot(G, timestamp, tuple(core_nodes))
+    active_nodes = set(core_nodes) | snapshot['active_nodes']  # Always include core nodes
+    interactions_count = snapshot['interactions_count']
+    connected_core_nodes = snapshot['connected_core_nodes']
+
+    # Copy the cached edge data so per-call flags don't leak into the cache
+    edge_dict = {
+        key: {'data': dict(edge_data)} for key, edge_data in snapshot['edge_dict'].items()
+    }
+
+    # Node metrics for non-core nodes come from the cached snapshot
+    centrality = snapshot['centrality']
+    betweenness = snapshot['betweenness']
+    color_metric = snapshot['color_metric']
+    max_color_metric = max(color_metric.values()) if color_metric else 1
 
     # Find the maximum interaction count for normalization
     max_interactions = max(interactions_count.values()) if interactions_count else 1
@@ -133,25 +290,16 @@ def get_elements(G, timestamp, core_nodes, tapNodeData=None):
         data = G.nodes[node]
         is_core = node in core_nodes
 
-        # Calculate the number of core nodes this node is connected to
-        connected_core_nodes = sum(
-            1 for core_node in core_nodes if temp_G.has_edge(node, core_node)
-        )
-
         # Size nodes based on interactions
         base_size = 45  # Base size for all nodes
         size_multiplier = 1 + (interactions_count[node] / max_interactions)  # Normalize size based on interactions
         node_size = base_size * size_multiplier
 
-        # Color nodes
-        if is_core:
-            node_color = "rgb(0, 255, 0)"  # Green color for core nodes
+        # Non-core nodes are colored by betweenness (or degree) centrality in the stylesheet
+        if not is_core and max_color_metric > 0:
+            color_value = color_metric.get(node, 0) / max_color_metric
         else:
-            # Color non-core nodes based on betweenness centrality
-            if max_betweenness > 0:
-                node_color = f"rgb({int(255 * betweenness.get(node, 0) / max_betweenness)}, 0, 255)"
-            else:
-                node_color = "rgb(0, 0, 255)"  # Default color if max_betweenness is 0
+            color_value = 0
 
         cyto_elements.append(
             {
@@ -166,8 +314,8 @@ def get_elements(G, timestamp, core_nodes, tapNodeData=None):
                     'is_core': 'true' if is_core else 'false',
                     'centrality': centrality.get(node, 0) if not is_core else 'N/A',
                     'betweenness': betweenness.get(node, 0) if not is_core else 'N/A',
-                    'color': node_color,
-                    'connected_core_nodes': connected_core_nodes,
+                    'color_value': color_value,
+                    'connected_core_nodes': connected_core_nodes[node],
                     'interactions_count': interactions_count[node],
                     'pfp_url': data.get('pfp_url')
                 }
@@ -183,14 +331,18 @@ def get_elements(G, timestamp, core_nodes, tapNodeData=None):
         selected_node_id = tapNodeData['id']
         highlighted_edges = set()
         highlighted_nodes = set()
+        temp_G = build_snapshot_graph(snapshot)
+        # One BFS from the selected node gives a shortest path to every core node
+        predecessors = nx.predecessor(temp_G, selected_node_id) if selected_node_id in temp_G else {}
         for core_node in core_nodes:
-            try:
-                path = nx.shortest_path(temp_G, source=selected_node_id, target=core_node)
-                highlighted_nodes.update(path)
-                path_edges = list(zip(path[:-1], path[1:]))
-                highlighted_edges.update(path_edges)
-            except nx.NetworkXNoPath:
-                pass  # If no path exists, skip
+            if core_node not in predecessors:
+                continue  # If no path exists, skip
+            path = [core_node]
+            while predecessors[path[-1]]:
+                path.append(predecessors[path[-1]][0])
+            highlighted_nodes.update(path)
+            path_edges = list(zip(path[:-1], path[1:]))
+            highlighted_edges.update(path_edges)
 
         # Update elements for highlighting
         for element in cyto_elements:
@@ -198,6 +350,7 @@ def get_elements(G, timestamp, core_nodes, tapNodeData=None):
             if 'source' in data and 'target' in data:  # It's an edge
                 source = data['source']
                 target = data['target']
+                data.pop('core_rank', None)  # Paths replace the top-N highlighting
                 if (source, target) in highlighted_edges or (target, source) in highlighted_edges:
                     data['edge_to_core'] = 'true'
                 else:
@@ -218,15 +371,41 @@ def get_elements(G, timestamp, core_nodes, tapNodeData=None):
 
     return cyto_elements
 
+def diff_elements(old_elements, new_elements):
+    """Delta that turns ``old_elements`` into ``new_elements``, matched by element id.
+
+    Updates carry only the changed data fields. An element that loses a field
+    is removed and re-added whole instead.
+    """
+    old = {element['data']['id']: element['data'] for element in old_elements}
+    delta = {'remove': [], 'add': [], 'update': []}
+    new_ids = set()
+    for element in new_elements:
+        data = element['data']
+        new_ids.add(data['id'])
+        old_data = old.get(data['id'])
+        if old_data is None:
+            delta['add'].append(element)
+        elif not old_data.keys() <= data.keys():
+            delta['remove'].append(data['id'])
+            delta['add'].append(element)
+        else:
+            changed = {key: value for key, value in data.items() if old_data.get(key) != value}
+            if changed:
+                delta['update'].append({'data': dict(changed, id=data['id'])})
+    delta['remove'].extend(element_id for element_id in old if element_id not in new_ids)
+    return delta
+
 def get_node_edge_counts(G, timestamp, core_nodes):
     visible_nodes = set(core_nodes)
     visible_edges = 0
 
     for u, v, data in G.edges(data=True):
-        if data['timestamp'] <= timestamp:
+        active_interactions = sum(1 for edge_timestamp, _ in data['timeline'] if edge_timestamp <= timestamp)
+        if active_interactions:
             visible_nodes.add(u)
             visible_nodes.add(v)
-            visible_edges += 1
+            visible_edges += active_interactions
 
     return len(visible_nodes), visible_edges
 